@@ -9,8 +9,11 @@ from tkinter import filedialog, messagebox, scrolledtext, simpledialog, ttk
 import os
 import sys
 import fnmatch
+import functools
 import hashlib
+import mmap
 import datetime
+import time
 import concurrent.futures
 import queue
 import threading
@@ -18,8 +21,9 @@ import multiprocessing
 import shutil
 import unicodedata
 import re
+import collections
 from pathlib import Path
-from typing import List, Iterable, Callable, Dict, Any, Tuple, Optional
+from typing import List, Iterable, Iterator, Callable, Dict, Any, Tuple, Optional, NamedTuple, Set
 
 # Third-party imports (for document processing)
 try:
@@ -33,22 +37,96 @@ try:
 except ImportError:
     DOCUMENT_SUPPORT = False
 
+# Optional: full .gitignore semantics (anchoring, "**", negation) for ignore matching
+try:
+    import pathspec
+    PATHSPEC_SUPPORT = True
+except ImportError:
+    PATHSPEC_SUPPORT = False
+
 # =======================================================================================
 # SHARED UTILITIES
 # =======================================================================================
 
+_SANITIZE_CONTROL_RE = re.compile(r"[\x00-\x08\x0B\x0C\x0E-\x1F\x7F]")
+# Same filter as a translate table, plus bare CR -> LF
+_SANITIZE_TABLE = {c: None for c in (*range(0x09), 0x0B, 0x0C, *range(0x0E, 0x20), 0x7F)}
+_SANITIZE_TABLE[0x0D] = 0x0A
+
 def sanitize_text(s: str) -> str:
     """Normalize unicode, standardize newlines, strip harmful control chars (keep \n and \t)."""
-    s = unicodedata.normalize('NFKC', s)
-    s = s.replace('\r\n', '\n').replace('\r', '\n')
+    s = unicodedata.normalize('NFKC', s)  # already-NFKC text comes back as-is after a quick check
+    # Clean text has no CR at all; one memchr-speed probe saves both newline rewrites
+    has_cr = '\r' in s
+    if has_cr:
+        s = s.replace('\r\n', '\n')
+    # str.translate has a C fast path for ASCII strings but is much slower than the regex otherwise
+    if s.isascii():
+        return s.translate(_SANITIZE_TABLE)
+    if has_cr:
+        s = s.replace('\r', '\n')
     # Remove control characters except tabs and newlines
-    control_filter = re.compile(r"[\x00-\x08\x0B\x0C\x0E-\x1F\x7F]")
-    s = control_filter.sub('', s)
-    return s
-
-def stable_hash(content: str) -> str:
-    """Generate a stable SHA256 hash for content."""
-    return f"sha256-{hashlib.sha256(content.encode('utf-8')).hexdigest()}"
+    return _SANITIZE_CONTROL_RE.sub('', s)
+
+# Knowledge files hard-wrap any line longer than this
+WRAP_LINE_CHARS = 10000
+
+def wrap_long_lines(s: str, width: int = WRAP_LINE_CHARS) -> str:
+    """Split lines longer than ``width`` into ``width``-char pieces; shorter lines pass through."""
+    if len(s) <= width:
+        return s
+    lines = s.split('\n')
+    # Nearly every document has no long line: one C-level length pass, and no rebuilt copy
+    if max(map(len, lines)) <= width:
+        return s
+    parts: List[str] = []
+    for line in lines:
+        if len(line) > width:
+            parts.extend(line[i:i + width] for i in range(0, len(line), width))
+        else:
+            parts.append(line)
+    return '\n'.join(parts)
+
+def stable_hash(*parts: str) -> str:
+    """Generate a stable SHA256 hash of the concatenated parts, fed in one at a time rather than joined."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode('utf-8'))
+    return f"sha256-{h.hexdigest()}"
+
+def hash_open_file(f, algorithm: str = "sha256") -> str:
+    """Hex digest of an already-open binary file's whole contents, regardless of its position."""
+    f.seek(0)
+    if hasattr(hashlib, "file_digest"):  # Python 3.11+
+        return hashlib.file_digest(f, algorithm).hexdigest()
+    h = hashlib.new(algorithm)
+    try:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            h.update(mm)
+    except ValueError:
+        pass  # Empty files cannot be mapped; digest of b"" is correct
+    return h.hexdigest()
+
+PREFETCH_WINDOW = 64
+# Reads kept in flight: at least storage queue depth (cold-cache SSD/NVMe); on many-core machines
+# more, since SHA-1 over warm-cache files releases the GIL and scales with cores
+PREFETCH_WORKERS = max(16, min(32, (os.cpu_count() or 4) * 4))
+
+def prefetch_map(func: Callable[[Any], Any], items: Iterable[Any], window: int = PREFETCH_WINDOW,
+                 workers: int = PREFETCH_WORKERS) -> Iterator[Any]:
+    """Ordered map(func, items) with up to ``window`` calls running ahead on I/O threads,
+    so file reads overlap with the consumer while the window bounds memory."""
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    pending: "collections.deque[concurrent.futures.Future]" = collections.deque()
+    try:
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
 
 # =======================================================================================
 # PROJECT CODE BUNDLER (from code_manifest.py)
@@ -128,98 +206,319 @@ def read_gitignore_patterns(project_root: Path) -> List[str]:
             pass
     return patterns
 
-def norm_for_match(p: Path, root: Path) -> str:
-    """Forward-slash, root-relative path; dirs end with '/'."""
+class FileEntry(NamedTuple):
+    """A walked file: its path, forward-slash root-relative path and the scandir entry it came from."""
+    path: Path
+    rel: str
+    dirent: os.DirEntry
+
+    @property
+    def size(self) -> int:
+        """Size in bytes (0 if unreadable); DirEntry caches the stat, so it is fetched at most once."""
+        try:
+            return self.dirent.stat().st_size
+        except OSError:  # e.g. a dangling symlink
+            return 0
+
+def _compile_alternation(patterns: List[str], flags: int) -> Optional["re.Pattern[str]"]:
+    if not patterns:
+        return None
+    return re.compile("|".join(fnmatch.translate(pat) for pat in patterns), flags)
+
+_GITIGNORE_ANY_DIR = "^(?:.+/)?"
+
+def _fold_gitignore_spec(spec: "pathspec.GitIgnoreSpec") -> Optional["re.Pattern[str]"]:
+    """Fold a spec without negations into one regex; pathspec otherwise tries each pattern in turn.
+
+    Returns None when folding would change results (negations need last-match-wins ordering).
+    """
+    active = [pat for pat in spec.patterns if pat.include is not None]
+    if not active or not all(pat.include for pat in active):
+        return None
+    flags = {pat.regex.flags for pat in active}
+    if len(flags) != 1:
+        return None
+    # Each pattern names its own directory-marker group; the union only needs the match itself
+    parts = [re.sub(r"\(\?P<\w+>", "(?:", pat.regex.pattern) for pat in active]
+    # Unanchored patterns ("any/depth/name") share one leading "(?:.+/)?" instead of each
+    # backtracking through it separately
+    floating = [part[len(_GITIGNORE_ANY_DIR):] for part in parts if part.startswith(_GITIGNORE_ANY_DIR)]
+    alts = [part for part in parts if not part.startswith(_GITIGNORE_ANY_DIR)]
+    if floating:
+        alts.append(_GITIGNORE_ANY_DIR + "(?:" + "|".join(floating) + ")")
     try:
-        rel = p.relative_to(root)
-    except Exception:
-        rel = p
-    s = str(rel).replace("\\", "/")
-    if p.is_dir() and not s.endswith("/"):
-        s += "/"
-    return s
-
-def should_ignore(path: Path, root: Path, patterns: List[str]) -> bool:
-    """Match against both the name and normalized root-relative path."""
-    name = path.name
-    rel = norm_for_match(path, root)
-    for pat in patterns:
-        pat = pat.replace("\\", "/")
-        if pat.endswith("/"):
-            if fnmatch.fnmatch(name + "/", pat) or fnmatch.fnmatch(rel, pat) or rel.startswith(pat):
-                return True
-        else:
-            if fnmatch.fnmatch(name, pat) or fnmatch.fnmatch(rel, pat):
+        return re.compile("|".join(f"(?:{alt})" for alt in alts), flags.pop())
+    except (re.error, TypeError):
+        return None
+
+class IgnoreMatcher:
+    """Ignore patterns compiled once: a gitignore spec via pathspec when installed,
+    otherwise fnmatch patterns translated into alternation regexes."""
+
+    def __init__(self, patterns: List[str]):
+        patterns = [pat.replace("\\", "/") for pat in patterns]
+        self.spec_match: Optional[Callable[[str], Any]] = None
+        if PATHSPEC_SUPPORT:
+            spec = pathspec.GitIgnoreSpec.from_lines(patterns)
+            folded = _fold_gitignore_spec(spec)
+            self.spec_match = folded.search if folded is not None else spec.match_file
+        # fnmatch is case-insensitive wherever the OS normalizes case (Windows)
+        flags = re.IGNORECASE if os.path.normcase("A") == "a" else 0
+        dir_patterns = [pat for pat in patterns if pat.endswith("/")]
+        file_patterns = [pat for pat in patterns if not pat.endswith("/")]
+        # Dir patterns are compiled without their trailing '/' so names match as-is
+        self.dir_re = _compile_alternation([pat[:-1] for pat in dir_patterns], flags)
+        self.dir_prefixes = tuple(dir_patterns)
+        self.file_re = _compile_alternation(file_patterns, flags)
+
+    def matches_dir(self, name: str, rel: str) -> bool:
+        """``rel`` is root-relative with a trailing '/'."""
+        if self.spec_match is not None:
+            return bool(self.spec_match(rel))
+        if self.dir_re is not None:
+            if (self.dir_re.match(name) or self.dir_re.match(rel, 0, len(rel) - 1)
+                    or rel.startswith(self.dir_prefixes)):
                 return True
-    return False
+        return self._matches_file_patterns(name, rel)
+
+    def matches_file(self, name: str, rel: str) -> bool:
+        """Assumes every ancestor directory was already checked and pruned by the walk, so the
+        directory-prefix test (and dir patterns vs. a path with no trailing '/') are skipped."""
+        if self.spec_match is not None:
+            return bool(self.spec_match(rel))
+        if self.dir_re is not None and self.dir_re.match(name):
+            return True
+        return self._matches_file_patterns(name, rel)
+
+    def _matches_file_patterns(self, name: str, rel: str) -> bool:
+        return self.file_re is not None and bool(self.file_re.match(name) or self.file_re.match(rel))
 
-def detect_language(path: Path) -> str:
-    return TEXT_EXT_HINT.get(path.suffix.lower(), "Plain Text")
+def should_ignore(name: str, rel: str, is_dir: bool, matcher: IgnoreMatcher) -> bool:
+    """Match against both the name and the root-relative path (dirs carry a trailing '/')."""
+    if is_dir:
+        return matcher.matches_dir(name, rel)
+    return matcher.matches_file(name, rel)
 
-def is_probably_binary(path: Path) -> bool:
-    ext = path.suffix.lower()
+def detect_language(path: Path, ext: Optional[str] = None) -> str:
+    """Language label for a file; pass ``ext`` (lower-cased suffix) if already computed."""
+    if ext is None:
+        ext = path.suffix.lower()
+    return TEXT_EXT_HINT.get(ext, "Plain Text")
+
+BINARY_SNIFF_BYTES = 4096
+
+def is_probably_binary(path: Path, ext: Optional[str] = None) -> bool:
+    if ext is None:
+        ext = path.suffix.lower()
     if ext in BINARY_EXT_LIKELY:
         return True
+    if ext in TEXT_EXT_HINT:
+        return False  # known text types skip the open + 4 KiB sniff
     try:
         with path.open("rb") as f:
-            chunk = f.read(4096)
+            chunk = f.read(BINARY_SNIFF_BYTES)
         if b"\x00" in chunk:
             return True
     except Exception:
         return True
     return False
 
-def iter_files(root: Path, patterns: List[str], follow_symlinks: bool) -> Iterable[Path]:
-    for cur_root, dirs, files in os.walk(root, topdown=True, followlinks=follow_symlinks):
-        cur_root_p = Path(cur_root)
-        dirs[:] = sorted([d for d in dirs if not should_ignore(cur_root_p / d, root, patterns)])
-        for fname in sorted(files):
-            p = cur_root_p / fname
-            if should_ignore(p, root, patterns):
+def iter_files(root: Path, patterns: List[str], follow_symlinks: bool) -> Iterator[FileEntry]:
+    """Yield non-ignored files in root-relative path order, exactly as sorting their ``rel`` would.
+
+    Walks with os.scandir so file/dir checks use the DirEntry's cached type. Each file keeps its
+    DirEntry, so a size lookup downstream costs one cached stat and the walk itself stats nothing.
+    Because the order is final as files are found, callers can stop early (see the preview).
+    """
+    matcher = IgnoreMatcher(patterns)
+    # Directories still to scan as (path, rel) and files ready to yield, next item on top
+    stack: List[Any] = [(root, "")]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, FileEntry):
+            yield item
+            continue
+        cur, rel_prefix = item
+        try:
+            with os.scandir(cur) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        kept = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            # Built once per entry; a directory's "rel/" doubles as its children's prefix
+            rel = f"{rel_prefix}{entry.name}/" if is_dir else rel_prefix + entry.name
+            if should_ignore(entry.name, rel, is_dir, matcher):
                 continue
-            yield p
-
-def make_tree_map(root: Path, visible_files: List[Path]) -> str:
-    """Render a compact project tree of visible files/dirs."""
-    visible_set = set(visible_files)
-    dir_set = {root}
-    for f in visible_files:
-        for parent in f.parents:
-            if parent == parent.parent:
-                break
-            if root in parent.parents or parent == root:
-                dir_set.add(parent)
-
-    lines = []
-    lines.append(f"{root.name or str(root)}/")
-    children = {d: {"dirs": [], "files": []} for d in dir_set}
-
-    for f in visible_files:
-        parent = f.parent
-        if parent in children:
-            children[parent]["files"].append(f)
-    for d in list(dir_set):
-        parent = d.parent
-        if parent in children and d != root:
-            children[parent]["dirs"].append(d)
-
-    def render(d: Path, prefix: str = ""):
-        subdirs = sorted(children.get(d, {}).get("dirs", []), key=lambda x: x.name)
-        files = sorted(children.get(d, {}).get("files", []), key=lambda x: x.name)
-        for i, sd in enumerate(subdirs):
-            is_last = (i == len(subdirs) - 1) and not files
-            branch = "└── " if is_last else "├── "
-            lines.append(prefix + branch + sd.name + "/")
-            new_prefix = prefix + ("    " if is_last else "│   ")
-            render(sd, new_prefix)
-        for j, f in enumerate(files):
-            is_last = j == len(files) - 1
-            branch = "└── " if is_last else "├── "
-            lines.append(prefix + branch + f.name)
-
-    render(root)
+            if not is_dir:
+                kept.append((rel, FileEntry(cur / entry.name, rel, entry)))
+            elif follow_symlinks or not entry.is_symlink():
+                kept.append((rel, (cur / entry.name, rel)))
+        # A directory sorts by "name/", which places its whole subtree where its paths would sort
+        kept.sort(key=lambda k: k[0], reverse=True)
+        stack.extend(pending for _, pending in kept)
+
+def make_tree_map_from_parts(root: Path, rel_parts: Iterable[Tuple[str, ...]]) -> str:
+    """Render the tree from root-relative path components (saves re-deriving them from Paths).
+
+    One sort (subdirectories ahead of files at every level) yields the rows in render
+    order as parallel depth/name/is_dir lists, which are then emitted without recursion.
+    """
+    # Sort keys are flat strings: "\x01dir\x00" per directory level, then "\x02file". Since NUL
+    # cannot occur in names, they order exactly like per-level (is_file, name) tuples but compare
+    # in C; each directory's prefix is built once and shared by all of its files
+    dir_keys: Dict[Tuple[str, ...], str] = {}
+    keyed = []
+    for parts in rel_parts:
+        if parts:
+            dirs = parts[:-1]
+            dir_key = dir_keys.get(dirs)
+            if dir_key is None:
+                dir_key = dir_keys[dirs] = "".join(f"\x01{part}\x00" for part in dirs)
+            keyed.append((f"{dir_key}\x02{parts[-1]}", parts))
+    keyed.sort()
+
+    depths: List[int] = []
+    names: List[str] = []
+    is_dirs: List[bool] = []
+    prev_dirs: Tuple[str, ...] = ()
+    for _, parts in keyed:
+        dirs = parts[:-1]
+        common = 0
+        while common < len(dirs) and common < len(prev_dirs) and dirs[common] == prev_dirs[common]:
+            common += 1
+        for depth in range(common, len(dirs)):  # directories first seen at this row
+            depths.append(depth)
+            names.append(dirs[depth] + "/")
+            is_dirs.append(True)
+        depths.append(len(dirs))
+        names.append(parts[-1])
+        is_dirs.append(False)
+        prev_dirs = dirs
+
+    # Backward pass: a row is its parent's last child if no later row shares its depth before the parent ends
+    is_last = [False] * len(depths)
+    sibling_follows: List[bool] = []
+    for i in range(len(depths) - 1, -1, -1):
+        d = depths[i]
+        del sibling_follows[d + 1:]
+        sibling_follows.extend([False] * (d + 1 - len(sibling_follows)))
+        is_last[i] = not sibling_follows[d]
+        sibling_follows[d] = True
+
+    lines = [f"{root.name or str(root)}/"]
+    prefix: List[str] = []
+    for d, name, is_dir, last in zip(depths, names, is_dirs, is_last):
+        del prefix[d:]
+        lines.append("".join(prefix) + ("└── " if last else "├── ") + name)
+        if is_dir:
+            prefix.append("    " if last else "│   ")
     return "\n".join(lines)
 
+# Project preview: text files drawn in the tree, and files walked before the counts stop
+PREVIEW_TREE_FILES = 50
+PREVIEW_SCAN_LIMIT = 5000
+
+# Output buffer for bundles and knowledge files: megabytes go out in a few dozen writes, not thousands
+OUTPUT_WRITE_BUFFER = 1 << 20
+
+# Minimum seconds between scan-phase progress updates, however fast files go by
+PROGRESS_INTERVAL = 0.1
+
+def scan_file(entry: FileEntry, max_bytes_per_file: int) -> Dict[str, Any]:
+    """Measure one file for the FILE INDEX (everything except its ID).
+
+    ``payload`` carries the (truncated) bytes that were read so the writer need not read the
+    file again; it is None for binary or unreadable files.
+    """
+    p = entry.path
+    ext = p.suffix.lower()
+    lang = detect_language(p, ext)
+    size = entry.size
+    
+    sha = ""
+    lines_count = 0
+    note = ""
+    payload = None
+    raw = b""
+    is_bin = ext in BINARY_EXT_LIKELY
+    if not is_bin:
+        # One open serves the binary sniff, the displayed prefix and the digest: a file that fits
+        # in the read is hashed from that buffer, a longer one streams through the same handle
+        want = max(max_bytes_per_file + 1, BINARY_SNIFF_BYTES)
+        sniffed = False
+        try:
+            with p.open("rb") as f:
+                raw = f.read(want)
+                is_bin = ext not in TEXT_EXT_HINT and b"\x00" in raw[:BINARY_SNIFF_BYTES]
+                sniffed = True
+                if is_bin:
+                    raw = b""
+                elif len(raw) == want:
+                    sha = hash_open_file(f, "sha1")
+                elif raw:
+                    sha = hashlib.sha1(raw).hexdigest()
+        except Exception:
+            raw = b""
+            sha = ""
+            # A failed sniff means binary, as in is_probably_binary; known text types never sniff
+            if not sniffed:
+                is_bin = ext not in TEXT_EXT_HINT
+            if not is_bin:
+                note = "read error: skipped"
+        else:
+            if not is_bin:
+                if len(raw) > max_bytes_per_file:
+                    raw = raw[:max_bytes_per_file]
+                    note = f"truncated to {max_bytes_per_file} bytes"
+                payload = raw
+    if is_bin:
+        note = "binary: skipped"
+    elif raw:
+        # Count on the bytes (b"\n" never sits inside a UTF-8 sequence). An unterminated last line
+        # counts if its bytes survive the lenient decode: always when the last byte is ASCII,
+        # otherwise (e.g. a truncated multi-byte char) decode just that tail to find out
+        lines_count = raw.count(b"\n")
+        tail = raw[raw.rfind(b"\n") + 1:]
+        if tail and (tail[-1] < 0x80 or tail.decode("utf-8", errors="ignore")):
+            lines_count += 1
+    
+    return {
+        "path": entry.rel,
+        "lang": lang if not is_bin else "Binary",
+        "size": size,
+        "lines": lines_count if not is_bin else 0,
+        "sha1": sha,
+        "is_binary": is_bin,
+        "note": note,
+        "payload": payload,
+    }
+
+def render_file_section(m: Dict[str, Any], content: Optional[bytes], skipped: str = "") -> bytes:
+    """One FILE section of the bundle: the header block, then ``content`` or a [SKIPPED] placeholder."""
+    fid = m["id"]
+    head = (f"===== FILE {fid} =====\n"
+            f"PATH: {m['path']}\n"
+            f"LANG: {m['lang']}\n"
+            f"BYTES: {m['size']}\n"
+            f"LINES: {m['lines']}\n"
+            f"SHA1: {m['sha1']}\n"
+            + (f"NOTE: {m['note']}\n" if m["note"] else "")
+            + "\n")
+    if content is None:
+        return (f"{head}[SKIPPED] {skipped}\n----- BEGIN CONTENT {fid} -----\n[No content]\n"
+                f"----- END CONTENT {fid} -----\n\n").encode("utf-8", errors="replace")
+    # ASCII goes out as-is; anything else is round-tripped to drop invalid UTF-8
+    if not content.isascii():
+        content = content.decode("utf-8", errors="ignore").encode("utf-8")
+    tail = b"" if content.endswith(b"\n") else b"\n"
+    return b"".join((f"{head}----- BEGIN CONTENT {fid} -----\n".encode("utf-8", errors="replace"), content,
+                     tail, f"----- END CONTENT {fid} -----\n\n".encode("ascii")))
+
 def render_llm_usage_guide(guide_mode: str) -> str:
     if guide_mode == "none":
         return ""
@@ -291,14 +590,19 @@ This is an AI Reference Sheet, a global manifest for multiple knowledge files.
 ---
 """
 
-    # Control characters to filter (keep tabs/newlines)
-    _CONTROL_FILTER = re.compile(r"[\x00-\x08\x0B\x0C\x0E-\x1F\x7F]")
+    _TRAILING_WS = re.compile(r"[ \t]+(?=\n)")
+    _MULTI_SPACE = re.compile(r"[ ]{2,}")
+    _EXTRA_BLANK_LINES = re.compile(r"\n{3,}")
 
     def _normalize_prose(s: str) -> str:
         """Collapse excessive spaces while preserving line structure."""
-        s = re.sub(r"[ \t]+(?=\n)", '', s)  # Trim trailing spaces at end of lines
-        s = re.sub(r"[ ]{2,}", ' ', s)      # Collapse multiple spaces inside lines
-        s = re.sub(r"\n{3,}", "\n\n", s)   # Reduce 3+ blank lines to 2
+        # Substring probes skip any pass that cannot match (the common case for clean text)
+        if " \n" in s or "\t\n" in s:
+            s = _TRAILING_WS.sub('', s)           # Trim trailing spaces at end of lines
+        if "  " in s:
+            s = _MULTI_SPACE.sub(' ', s)          # Collapse multiple spaces inside lines
+        if "\n\n\n" in s:
+            s = _EXTRA_BLANK_LINES.sub("\n\n", s)  # Reduce 3+ blank lines to 2
         return s.strip()
 
     CODE_START = "@@@CODEBLOCK_START@@@"
@@ -307,20 +611,10 @@ This is an AI Reference Sheet, a global manifest for multiple knowledge files.
 
     def normalize_text_code_safe(s: str) -> str:
         """Sanitize, then normalize prose but keep code blocks verbatim."""
-        s = sanitize_text(s)
-        out = []
-        i = 0
-        for m in _CODE_OR_MARKERS.finditer(s):
-            pre = s[i:m.start()]
-            code = m.group(0)
-            if pre:
-                out.append(_normalize_prose(pre))
-            out.append(code)  # keep code untouched
-            i = m.end()
-        tail = s[i:]
-        if tail:
-            out.append(_normalize_prose(tail))
-        return ''.join(out)
+        # The capturing group makes split() alternate prose, code, prose, ...; code stays untouched
+        parts = _CODE_OR_MARKERS.split(sanitize_text(s))
+        parts[::2] = [_normalize_prose(prose) if prose else prose for prose in parts[::2]]
+        return ''.join(parts)
 
     def _html_to_text_preserving_code(html: str) -> str:
         soup = BeautifulSoup(html, 'html.parser')
@@ -330,18 +624,20 @@ This is an AI Reference Sheet, a global manifest for multiple knowledge files.
         txt = soup.get_text(separator='\n')
         return normalize_text_code_safe(txt)
 
+    _TITLE_UNSAFE_CHARS = re.compile(r"[^\w\s\-\.,'()&]+")
+
     def _normalize_title_from_path(file_path: str) -> str:
         raw_name = os.path.splitext(os.path.basename(file_path))[0]
-        safe = re.sub(r"[^\w\s\-\.,'()&]+", ' ', raw_name).strip()
+        safe = _TITLE_UNSAFE_CHARS.sub(' ', raw_name).strip()
         return normalize_text_code_safe(safe.title())
 
-    def _stable_sample(text: str, k: int = 2000) -> str:
+    def _stable_sample_parts(text: str, k: int = 2000) -> Tuple[str, ...]:
+        """Head, middle and tail slices of ``text``, hashed in sequence instead of joined."""
         n = len(text)
         if n <= k:
-            return text
+            return (text,)
         mid = n // 2
-        parts = [text[:k], text[max(0, mid - k // 2): mid + k // 2], text[-k:]]
-        return ''.join(parts)
+        return (text[:k], text[max(0, mid - k // 2): mid + k // 2], text[-k:])
 
     class IDManager:
         ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
@@ -385,14 +681,40 @@ This is an AI Reference Sheet, a global manifest for multiple knowledge files.
         except Exception as e:
             raise ExtractionError(f"Reason: {e}") from e
 
+    # A PDF of at least two ranges' worth of pages is split into page ranges, each extracted as a
+    # task of its own on the document pool (see collect_files); never more ranges than cores
+    PDF_PAGES_PER_RANGE = 128
+    PDF_MAX_PAGE_RANGES = 4
+
+    def pdf_page_ranges(file_path: str) -> List[Tuple[int, int]]:
+        """(start, stop) page ranges to extract a PDF in; a single range unless it is large."""
+        try:
+            with fitz.open(file_path) as doc:
+                page_count = doc.page_count
+        except Exception as e:
+            raise ExtractionError(f"Reason: {e}") from e
+        parts = min(PDF_MAX_PAGE_RANGES, os.cpu_count() or 1, page_count // PDF_PAGES_PER_RANGE)
+        if parts < 2:
+            return [(0, page_count)]
+        step = -(-page_count // parts)
+        return [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+
+    def extract_pdf_page_range(file_path: str, start: int, stop: int) -> str:
+        # Each task opens its own Document; PyMuPDF objects can't be shared between processes
+        with fitz.open(file_path) as doc:
+            return "".join(doc[i].get_text("text") for i in range(start, stop))
+
+    def _normalize_pdf_text(raw: str) -> str:
+        text = normalize_text_code_safe(raw)
+        if not text:
+            raise ExtractionError("No selectable text found (likely scanned PDF).")
+        return text
+
     def extract_text_from_pdf(file_path: str) -> str:
         try:
             with fitz.open(file_path) as doc:
                 text = "".join(page.get_text("text") for page in doc)
-            text = normalize_text_code_safe(text)
-            if not text:
-                raise ExtractionError("No selectable text found (likely scanned PDF).")
-            return text
+            return _normalize_pdf_text(text)
         except Exception as e:
             raise ExtractionError(f"Reason: {e}") from e
 
@@ -465,23 +787,112 @@ This is an AI Reference Sheet, a global manifest for multiple knowledge files.
             return file_path, {"error": f"Unsupported file type"}
 
         try:
-            text = extractor_map[ext](file_path)
-            if not text.strip():
-                return file_path, {"error": "Extracted text is empty."}
-
-            hash_content = normalize_text_code_safe(title) + _stable_sample(text, 2000)
-            full_hash = stable_hash(hash_content)
-            short_id = IDManager.generate_short_id(full_hash, prefix=id_prefix, length=6)
-
-            return file_path, {
-                "short_id": short_id,
-                "full_hash": full_hash,
-                "title": title,
-                "text": text,
-            }
+            if ext == '.pdf':
+                # A large PDF comes back as its page ranges; collect_files queues them as separate tasks
+                page_ranges = pdf_page_ranges(file_path)
+                if len(page_ranges) > 1:
+                    return file_path, {"page_ranges": page_ranges}
+            return _document_result(file_path, title, extractor_map[ext](file_path), id_prefix)
         except ExtractionError as e:
             return file_path, {"error": f"{type(e).__name__}: {e}"}
 
+    def finish_pdf_pages(file_path: str, id_prefix: str, page_texts: List[str]) -> Tuple[str, Dict[str, Any]]:
+        """process_single_file's result for a PDF whose page ranges were extracted as separate tasks."""
+        try:
+            try:
+                text = _normalize_pdf_text("".join(page_texts))
+            except Exception as e:
+                raise ExtractionError(f"Reason: {e}") from e
+            return _document_result(file_path, _normalize_title_from_path(file_path), text, id_prefix)
+        except ExtractionError as e:
+            return file_path, {"error": f"{type(e).__name__}: {e}"}
+
+    def _document_result(file_path: str, title: str, text: str, id_prefix: str) -> Tuple[str, Dict[str, Any]]:
+        if not text.strip():
+            return file_path, {"error": "Extracted text is empty."}
+
+        full_hash = stable_hash(normalize_text_code_safe(title), *_stable_sample_parts(text, 2000))
+        short_id = IDManager.generate_short_id(full_hash, prefix=id_prefix, length=6)
+
+        return file_path, {
+            "short_id": short_id,
+            "full_hash": full_hash,
+            "title": title,
+            "text": text,
+        }
+
+    def submit_files(file_paths: List[str], id_prefix: str,
+                     executor: concurrent.futures.Executor) -> Dict[concurrent.futures.Future, str]:
+        """Queue documents for extraction in worker processes without waiting; pair with collect_files().
+
+        Extraction stays in processes: PyMuPDF holds the GIL and the HTML/prose passes are pure Python.
+        """
+        return {executor.submit(process_single_file, fp, id_prefix): fp for fp in file_paths}
+
+    def collect_files(future_to_file: Dict[concurrent.futures.Future, str], id_prefix: str,
+                      executor: concurrent.futures.Executor) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yield (path, result) for submitted documents as each one finishes.
+
+        A large PDF first comes back as page ranges: each is queued on ``executor`` as a task of its
+        own, then one more task normalizes and hashes the joined text, so the PDF spreads over the
+        same pool instead of starting another. Follow-up futures are added to ``future_to_file``,
+        so once this is exhausted the caller holds every future the batch used.
+        """
+        waiting = set(future_to_file)
+        range_index: Dict[concurrent.futures.Future, int] = {}
+        page_texts: Dict[str, List[Optional[str]]] = {}  # per split PDF, None until its range is in
+
+        def follow_up(src_path: str, fn: Callable[..., Any], *args: Any) -> concurrent.futures.Future:
+            try:
+                future = executor.submit(fn, *args)
+            except concurrent.futures.BrokenExecutor as e:
+                future = concurrent.futures.Future()  # reported like any other crashed task
+                future.set_exception(e)
+            future_to_file[future] = src_path
+            waiting.add(future)
+            return future
+
+        while waiting:
+            done, waiting = concurrent.futures.wait(waiting, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                src_path = future_to_file[future]
+                if future in range_index:
+                    texts = page_texts.get(src_path)
+                    if texts is None:
+                        continue  # another range of this PDF already failed
+                    try:
+                        texts[range_index[future]] = future.result()
+                    except Exception as e:
+                        del page_texts[src_path]
+                        if isinstance(e, concurrent.futures.BrokenExecutor):
+                            yield src_path, {"error": f"Worker crashed: {e}"}
+                        else:
+                            yield src_path, {"error": f"ExtractionError: Reason: {e}"}
+                        continue
+                    if None not in texts:
+                        del page_texts[src_path]
+                        follow_up(src_path, finish_pdf_pages, src_path, id_prefix, texts)
+                    continue
+                try:
+                    _, result = future.result()
+                except Exception as e:
+                    result = {"error": f"Worker crashed: {e}"}
+                if "page_ranges" in result:
+                    page_texts[src_path] = [None] * len(result["page_ranges"])
+                    for i, (start, stop) in enumerate(result["page_ranges"]):
+                        range_index[follow_up(src_path, extract_pdf_page_range, src_path, start, stop)] = i
+                    continue
+                yield src_path, result
+
+    # Documents rendered ahead of the knowledge-file writer; each holds a full encoded text in memory
+    RENDER_AHEAD_DOCS = 4
+
+    def render_document_section(doc: Dict[str, Any]) -> Tuple[bytes, bytes, bytes]:
+        """A document's START marker, sanitized and wrapped body, and END marker, encoded for writing."""
+        return (f"[START OF DOCUMENT: {doc['short_id']} | Title: {doc['title']}]\n\n".encode('utf-8'),
+                wrap_long_lines(sanitize_text(doc['text'])).encode('utf-8'),
+                f"\n\n[END OF DOCUMENT: {doc['short_id']}]\n---\n\n".encode('utf-8'))
+
 # =======================================================================================
 # UNIFIED GUI APPLICATION
 # =======================================================================================
@@ -496,6 +907,7 @@ This tool combines two powerful features for preparing content for LLMs:
 - Includes project tree, file index with stable IDs, and LLM usage guide
 - Perfect for code analysis, debugging, and development tasks
 - Respects .gitignore and includes comprehensive ignore patterns
+  (full gitignore semantics such as `**` and `!negation` when `pathspec` is installed)
 
 **2. DOCUMENT KNOWLEDGE FILE CREATOR** (requires PyMuPDF, ebooklib, beautifulsoup4, mobi)
 - Converts books and documents (TXT, PDF, EPUB, MOBI) into structured knowledge files
@@ -532,6 +944,82 @@ A comprehensive solution for preparing content for Large Language Models.
 **Purpose:** Streamline LLM content preparation workflows
 """
 
+# DocID prefixes keep only ASCII letters and digits
+_ID_PREFIX_CLEAN_RE = re.compile(r"[^A-Za-z0-9]")
+
+# A knowledge file's TOC entry, as read back by the reference sheet builder
+_DOC_ID_RE = re.compile(r"^\[DocID: ([A-Z0-9]+) \((sha256-[a-f0-9]{64})\) \| Title: ([^\]]+)\]\s*$")
+
+# Files at least this large are mapped rather than read when scanning for DocID entries
+DOC_ID_MMAP_MIN = 64 * 1024
+
+def _doc_id_lines_in(data) -> Iterator[str]:
+    """Decoded lines of ``data`` (bytes or an mmap) containing "[DocID:", split as text mode would."""
+    pos = data.find(b"[DocID:")
+    while pos != -1:
+        start = data.rfind(b"\n", 0, pos) + 1
+        end = data.find(b"\n", pos)
+        if end == -1:
+            end = len(data)
+        # A lone "\r" also ends a line in text mode; "\r\n" leaves only an empty last piece
+        for line in data[start:end].decode("utf-8", errors="ignore").split("\r"):
+            if "[DocID:" in line:
+                yield line
+        pos = data.find(b"[DocID:", end)
+
+def iter_doc_id_lines(path: str) -> Iterator[str]:
+    """Lines of a knowledge file that carry the DocID marker; the rest of the file is never decoded."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < DOC_ID_MMAP_MIN:
+            yield from _doc_id_lines_in(f.read())
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield from _doc_id_lines_in(mm)
+
+def scan_doc_id_entries(path: str) -> Tuple[List[Tuple[str, str]], List[str], Optional[Exception]]:
+    """(short_id, title) of each TOC entry in a knowledge file, the marker lines that did not parse,
+    and the error that cut the scan short, if any (entries found before it are kept)."""
+    entries: List[Tuple[str, str]] = []
+    skipped: List[str] = []
+    try:
+        for line in iter_doc_id_lines(path):
+            m = _DOC_ID_RE.match(line)
+            if m:
+                entries.append((m.group(1), m.group(3)))
+            else:
+                skipped.append(line.strip())
+    except Exception as e:
+        return entries, skipped, e
+    return entries, skipped, None
+
+# A directory named by at least this many imported paths is listed once instead of stat-ing each
+EXISTS_SCANDIR_MIN = 8
+
+def existing_paths(paths: Iterable[str]) -> Set[str]:
+    """The ``paths`` for which os.path.exists() holds, answered from one listing per shared directory.
+
+    A name found in its directory's listing exists (symlinks still get a real check, since they may
+    dangle); a name not found, e.g. in another case on a case-insensitive volume, falls back to
+    os.path.exists().
+    """
+    by_dir: Dict[str, List[str]] = collections.defaultdict(list)
+    for path in paths:
+        by_dir[os.path.dirname(path)].append(path)
+    found: Set[str] = set()
+    for directory, dir_paths in by_dir.items():
+        listed: Dict[str, os.DirEntry] = {}
+        if len(dir_paths) >= EXISTS_SCANDIR_MIN:
+            try:
+                with os.scandir(directory or ".") as it:
+                    listed = {entry.name: entry for entry in it}
+            except OSError:
+                pass
+        for path in dir_paths:
+            entry = listed.get(os.path.basename(path))
+            if (entry is not None and not entry.is_symlink()) or os.path.exists(path):
+                found.add(path)
+    return found
+
 class UnifiedLLMPrepTool:
     def __init__(self, root: tk.Tk):
         self.root = root
@@ -541,10 +1029,16 @@ class UnifiedLLMPrepTool:
         # Shared state
         self.log_queue: "queue.Queue[Tuple[str, str]]" = queue.Queue()
         self.processing_thread: Optional[threading.Thread] = None
+        self._last_pct = 0  # value last given to the progress bar
         
         # Document processor state
         self.file_queue: List[str] = []
+        self.file_queue_set: Set[str] = set()  # membership index for file_queue
+        # file_queue ordered by file name; rebuilt by update_queue_display after every queue change
+        self.sorted_file_queue: List[str] = []
         self.docid_prefix: str = "DOC"
+        # Extraction worker processes, started on first use and kept warm for the whole session
+        self._doc_pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
         
         self._build_ui()
         self.root.protocol("WM_DELETE_WINDOW", self._on_closing)
@@ -757,18 +1251,31 @@ class UnifiedLLMPrepTool:
             ignore_patterns = list(DEFAULT_IGNORE)
             ignore_patterns += read_gitignore_patterns(project_root)
             
-            files = list(iter_files(project_root, ignore_patterns, self.follow_symlinks_var.get()))
-            files.sort(key=lambda p: str(p))
+            # iter_files yields in path order, so the walk can stop once PREVIEW_SCAN_LIMIT files are seen
+            total_files, shown, more_text = 0, [], 0
+            truncated = False
+            for e in iter_files(project_root, ignore_patterns, self.follow_symlinks_var.get()):
+                if total_files == PREVIEW_SCAN_LIMIT:
+                    truncated = True
+                    break
+                total_files += 1
+                if is_probably_binary(e.path):
+                    continue
+                if len(shown) < PREVIEW_TREE_FILES:
+                    shown.append(e)
+                else:
+                    more_text += 1
+            plus = "+" if truncated else ""
             
             # Create a preview of the project structure
-            preview_lines = [f"Project Root: {project_root}", f"Total Files: {len(files)}", "", "Project Tree:"]
+            preview_lines = [f"Project Root: {project_root}", f"Total Files: {total_files}{plus}", "", "Project Tree:"]
             
-            visible_text_files = [f for f in files if not is_probably_binary(f)]
-            tree_map = make_tree_map(project_root, visible_text_files[:50])  # Limit preview
+            # The walk already produced root-relative paths; no per-file relative_to() needed
+            tree_map = make_tree_map_from_parts(project_root, [tuple(e.rel.split("/")) for e in shown])
             preview_lines.append(tree_map)
             
-            if len(visible_text_files) > 50:
-                preview_lines.append(f"\n... and {len(visible_text_files) - 50} more files")
+            if more_text:
+                preview_lines.append(f"\n... and {more_text}{plus} more files")
             
             self._update_preview("\n".join(preview_lines))
             
@@ -830,14 +1337,13 @@ class UnifiedLLMPrepTool:
             # Collect files
             files = list(iter_files(project_root, ignore_patterns, self.follow_symlinks_var.get()))
             
-            # Sort deterministically
+            # Sort deterministically. The walk already yields path order, and sort() is stable,
+            # so the other modes sort on their own key and keep path order for ties
             sort_mode = self.sort_mode_var.get()
             if sort_mode == "size":
-                files.sort(key=lambda p: (p.stat().st_size if p.exists() else 0, str(p)))
+                files.sort(key=lambda e: e.size)
             elif sort_mode == "ext":
-                files.sort(key=lambda p: (p.suffix.lower(), str(p)))
-            else:
-                files.sort(key=lambda p: str(p))
+                files.sort(key=lambda e: e.path.suffix.lower())
             
             self.log_queue.put((f"Found {len(files)} files to process", 'INFO'))
             
@@ -848,131 +1354,113 @@ class UnifiedLLMPrepTool:
             def file_id(i: int) -> str:
                 return f"{id_prefix}{i:0{id_width}d}"
             
-            # Pre-measure & pre-hash
+            # Pre-measure & pre-hash (reads run ahead of this loop on reader threads)
+            scan = functools.partial(scan_file, max_bytes_per_file=max_bytes_per_file)
             meta = []
-            for i, p in enumerate(files, start=1):
-                rel = p.relative_to(project_root).as_posix()
-                lang = detect_language(p)
-                is_bin = is_probably_binary(p)
-                size = p.stat().st_size if p.exists() else 0
-                
-                sha = ""
-                lines_count = 0
-                note = ""
-                if is_bin:
-                    note = "binary: skipped"
-                else:
-                    try:
-                        raw_full = p.read_bytes()
-                    except Exception:
-                        raw_full = b""
-                        note = "read error: skipped"
-                    if raw_full:
-                        sha = hashlib.sha1(raw_full).hexdigest()
-                        raw = raw_full[:max_bytes_per_file]
-                        if len(raw_full) > max_bytes_per_file:
-                            note = f"truncated to {max_bytes_per_file} bytes"
-                        text_preview = raw.decode("utf-8", errors="ignore")
-                        lines_count = text_preview.count("\n") + (1 if text_preview and not text_preview.endswith("\n") else 0)
-                
-                meta.append({
-                    "id": file_id(i),
-                    "path": rel,
-                    "lang": lang if not is_bin else "Binary",
-                    "size": size,
-                    "lines": lines_count if not is_bin else 0,
-                    "sha1": sha,
-                    "is_binary": is_bin,
-                    "note": note,
-                })
+            cached_total = 0
+            last_progress_at = time.monotonic()
+            last_progress = 0
+            for i, m in enumerate(prefetch_map(scan, files), start=1):
+                m["id"] = file_id(i)
+                meta.append(m)
+                # Keep read payloads for the write phase, holding at most max_total_bytes in memory;
+                # anything past that is read from disk again when its section is written
+                payload = m["payload"]
+                if payload is not None:
+                    if cached_total + len(payload) > max_total_bytes:
+                        m["payload"] = None
+                        m["payload_size"] = len(payload)
+                    else:
+                        cached_total += len(payload)
                 
-                if i % 50 == 0:  # Progress update
-                    progress = int((i / len(files)) * 50)  # First 50% for analysis
-                    self.log_queue.put((f"__PROGRESS__{progress}", 'INFO'))
+                now = time.monotonic()
+                if now - last_progress_at >= PROGRESS_INTERVAL:  # Progress update
+                    last_progress_at = now
+                    progress = i * 50 // len(files)  # First 50% for analysis
+                    if progress != last_progress:  # a slow scan can sit on one percent for many ticks
+                        self.log_queue.put((f"__PROGRESS__{progress}", 'INFO'))
+                        last_progress = progress
             
             # Write bundle
             timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            with output_file.open("w", encoding="utf-8", errors="ignore") as out:
+            with output_file.open("wb", buffering=OUTPUT_WRITE_BUFFER) as out:
+                def emit(*parts: str) -> None:
+                    """Write text as one encoded chunk; an undecodable file name shows up as "?"."""
+                    out.write("".join(parts).encode("utf-8", errors="replace"))
+                
                 # Header
-                out.write("# PROJECT BUNDLE\n")
-                out.write(f"# Generated: {timestamp}\n")
-                out.write(f"# Root: {project_root}\n")
-                out.write("# Format: LLM guide + project map + file index + file sections with stable IDs\n\n")
+                emit("# PROJECT BUNDLE\n",
+                     f"# Generated: {timestamp}\n",
+                     f"# Root: {project_root}\n",
+                     "# Format: LLM guide + project map + file index + file sections with stable IDs\n\n")
                 
                 # LLM usage guide
-                out.write(render_llm_usage_guide(self.llm_guide_var.get()))
+                emit(render_llm_usage_guide(self.llm_guide_var.get()))
                 
                 # Project Map
-                out.write("## PROJECT MAP\n")
-                out.write("```\n")
-                visible_text_files = [project_root / m["path"] for m in meta if not m["is_binary"]]
-                out.write(make_tree_map(project_root, visible_text_files))
-                out.write("\n```\n\n")
+                visible_parts = [tuple(m["path"].split("/")) for m in meta if not m["is_binary"]]
+                emit("## PROJECT MAP\n", "```\n", make_tree_map_from_parts(project_root, visible_parts), "\n```\n\n")
                 
-                # Global Index / TOC
-                out.write("## FILE INDEX (Global TOC)\n")
-                out.write("| ID | Path | Lang | Bytes | Lines | SHA1 | Note |\n")
-                out.write("|---:|------|------:|------:|------:|------|------|\n")
-                for m in meta:
-                    sha_disp = (m["sha1"][:10] + "…") if m["sha1"] else ""
-                    note_disp = m["note"] or ""
-                    out.write(f"| {m['id']} | {m['path']} | {m['lang']} | {m['size']} | {m['lines']} | {sha_disp} | {note_disp} |\n")
-                out.write("\n")
+                # Global Index / TOC: rows are formatted into one list and encoded/written once
+                emit("## FILE INDEX (Global TOC)\n",
+                     "| ID | Path | Lang | Bytes | Lines | SHA1 | Note |\n",
+                     "|---:|------|------:|------:|------:|------|------|\n",
+                     *[f"| {m['id']} | {m['path']} | {m['lang']} | {m['size']} | {m['lines']} | "
+                       f"{(m['sha1'][:10] + '…') if m['sha1'] else ''} | {m['note'] or ''} |\n" for m in meta],
+                     "\n")
                 
                 # File Sections
-                out.write("---\n\n")
+                emit("---\n\n")
                 written_total = 0
+                last_progress = -1
                 
-                for idx, m in enumerate(meta):
-                    fid = m["id"]
-                    path = project_root / m["path"]
-                    out.write(f"===== FILE {fid} =====\n")
-                    out.write(f"PATH: {m['path']}\n")
-                    out.write(f"LANG: {m['lang']}\n")
-                    out.write(f"BYTES: {m['size']}\n")
-                    out.write(f"LINES: {m['lines']}\n")
-                    out.write(f"SHA1: {m['sha1']}\n")
-                    if m["note"]:
-                        out.write(f"NOTE: {m['note']}\n")
-                    out.write("\n")
-                    
-                    if m["is_binary"]:
-                        out.write("[SKIPPED] Binary content not included.\n")
-                        out.write(f"----- BEGIN CONTENT {fid} -----\n")
-                        out.write("[No content]\n")
-                        out.write(f"----- END CONTENT {fid} -----\n\n")
-                        continue
-                    
+                def read_payload(m: Dict[str, Any]) -> Optional[bytes]:
                     try:
-                        raw_full = path.read_bytes()
+                        # Only the prefix that will be written is read, however large the file
+                        with (project_root / m["path"]).open("rb") as f:
+                            return f.read(max_bytes_per_file)
                     except Exception:
-                        out.write("[SKIPPED] Could not read file as text.\n")
-                        out.write(f"----- BEGIN CONTENT {fid} -----\n")
-                        out.write("[No content]\n")
-                        out.write(f"----- END CONTENT {fid} -----\n\n")
+                        return None
+                
+                def load_payload(m: Dict[str, Any]) -> Optional[bytes]:
+                    """Section bytes for a text file: the scan's cached prefix, else a fresh read.
+
+                    Prefixes dropped from the cache for the budget are left unread here; the writer
+                    nearly always skips them too, and reads one only if its budget check passes.
+                    """
+                    payload = m.pop("payload")
+                    if payload is None and not m["is_binary"] and "payload_size" not in m:
+                        payload = read_payload(m)
+                    return payload
+                
+                # Uncached payloads are re-read on reader threads ahead of this loop; each section
+                # is rendered to one blob, and only the size budget is decided here, in order
+                for idx, (m, write_bytes) in enumerate(zip(meta, prefetch_map(load_payload, meta))):
+                    if m["is_binary"]:
+                        out.write(render_file_section(m, None, "Binary content not included."))
+                        continue
+                    if write_bytes is None and "payload_size" in m:
+                        if written_total + m["payload_size"] > max_total_bytes:
+                            out.write(render_file_section(m, None, "Total bundle size limit reached."))
+                            continue
+                        write_bytes = read_payload(m)  # budget freed by a section skipped earlier
+                    if write_bytes is None:
+                        out.write(render_file_section(m, None, "Could not read file as text."))
                         continue
-                    
-                    write_bytes = raw_full[:max_bytes_per_file]
                     if written_total + len(write_bytes) > max_total_bytes:
-                        out.write("[SKIPPED] Total bundle size limit reached.\n")
-                        out.write(f"----- BEGIN CONTENT {fid} -----\n")
-                        out.write("[No content]\n")
-                        out.write(f"----- END CONTENT {fid} -----\n\n")
+                        out.write(render_file_section(m, None, "Total bundle size limit reached."))
                         continue
                     
-                    text = write_bytes.decode("utf-8", errors="ignore")
-                    out.write(f"----- BEGIN CONTENT {fid} -----\n")
-                    out.write(text)
-                    if not text.endswith("\n"):
-                        out.write("\n")
-                    out.write(f"----- END CONTENT {fid} -----\n\n")
+                    out.write(render_file_section(m, write_bytes))
                     written_total += len(write_bytes)
                     
-                    # Progress update
-                    progress = int(50 + ((idx + 1) / len(meta)) * 50)  # Second 50% for writing
-                    self.log_queue.put((f"__PROGRESS__{progress}", 'INFO'))
+                    # Progress update, only when the displayed percentage moves
+                    progress = 50 + (idx + 1) * 50 // len(meta)  # Second 50% for writing
+                    if progress != last_progress:
+                        self.log_queue.put((f"__PROGRESS__{progress}", 'INFO'))
+                        last_progress = progress
                 
-                out.write(f"\n✅ Project bundling complete. Files: {len(meta)} | Wrote ~{written_total} bytes\n")
+                emit(f"\n✅ Project bundling complete. Files: {len(meta)} | Wrote ~{written_total} bytes\n")
             
             self.log_queue.put((f"✅ Successfully created project bundle: {output_file}", 'SUCCESS'))
             self.log_queue.put((f"Total files processed: {len(meta)}", 'SUCCESS'))
@@ -1002,8 +1490,9 @@ class UnifiedLLMPrepTool:
         )
         if files:
             for f in files:
-                if f not in self.file_queue:
+                if f not in self.file_queue_set:
                     self.file_queue.append(f)
+                    self.file_queue_set.add(f)
             self.update_queue_display()
     
     def clear_queue(self):
@@ -1013,18 +1502,22 @@ class UnifiedLLMPrepTool:
             return
         if messagebox.askyesno("Confirm", "Are you sure you want to clear the document queue?"):
             self.file_queue.clear()
+            self.file_queue_set.clear()
             self.update_queue_display()
     
     def update_queue_display(self):
         """Update the document queue display."""
+        # Each name is parsed once, for both the sort key and its display line (queue paths are unique)
+        names = {f: os.path.basename(f) for f in self.file_queue}
+        self.sorted_file_queue = sorted(self.file_queue, key=names.__getitem__)
         self.queue_display.config(state='normal')
         self.queue_display.delete('1.0', tk.END)
         if not self.file_queue:
             self.queue_display.insert(tk.END, "Document queue is empty. Use 'Add Documents' to add files.")
         else:
-            display_queue = sorted(self.file_queue, key=os.path.basename)
-            for i, f in enumerate(display_queue, 1):
-                self.queue_display.insert(tk.END, f"{i}. {os.path.basename(f)}\n")
+            self.queue_display.insert(tk.END, "".join(
+                f"{i}. {names[f]}\n" for i, f in enumerate(self.sorted_file_queue, 1)
+            ))
         self.queue_display.config(state='disabled')
     
     def check_for_duplicates(self):
@@ -1052,6 +1545,7 @@ class UnifiedLLMPrepTool:
             f"The following duplicates were found:\n\n{dup_list}\n\nRemove duplicates from queue?"
         ):
             self.file_queue = list(seen.values())
+            self.file_queue_set = set(self.file_queue)
             self.update_queue_display()
             messagebox.showinfo("Check for Duplicates", f"Removed {len(duplicates)} duplicates from the queue.")
     
@@ -1085,7 +1579,7 @@ class UnifiedLLMPrepTool:
             "Optional", "DocID prefix (letters/numbers, default 'DOC'):", initialvalue=self.docid_prefix
         )
         if id_prefix:
-            id_prefix = re.sub(r"[^A-Za-z0-9]", "", id_prefix).upper()
+            id_prefix = _ID_PREFIX_CLEAN_RE.sub("", id_prefix).upper()
             if not id_prefix:
                 id_prefix = "DOC"
         else:
@@ -1094,12 +1588,22 @@ class UnifiedLLMPrepTool:
         
         self._start_worker_thread(
             self._process_documents_worker,
-            (self.file_queue.copy(), output_dir, base_name, chunk_size, id_prefix)
+            (self.sorted_file_queue.copy(), output_dir, base_name, chunk_size, id_prefix)
         )
     
+    def _document_pool(self, fresh: bool = False) -> concurrent.futures.ProcessPoolExecutor:
+        """The session's extraction pool; ``fresh`` replaces it after a worker died and broke it."""
+        if fresh and self._doc_pool is not None:
+            self._doc_pool.shutdown(wait=False)
+            self._doc_pool = None
+        if self._doc_pool is None:
+            self._doc_pool = concurrent.futures.ProcessPoolExecutor(max_workers=os.cpu_count() or 2)
+        return self._doc_pool
+    
     def _process_documents_worker(self, file_paths: List[str], output_dir: str, base_name: str, chunk_size: int, id_prefix: str):
         """Worker thread for document processing."""
         self.log_queue.put(("Sorting document queue alphabetically...", 'INFO'))
+        # The GUI passes the queue already in this order, which Timsort confirms in a single pass
         file_paths.sort(key=os.path.basename)
         
         total_processed, total_failed, batch_num = 0, 0, 1
@@ -1107,54 +1611,69 @@ class UnifiedLLMPrepTool:
         
         total = len(file_paths)
         done = 0
+        last_pct = 0
         
-        for chunk in file_chunks:
+        def submit_batch(chunk: List[str], fresh_pool: bool = False) -> Dict[concurrent.futures.Future, str]:
+            if not fresh_pool:
+                try:
+                    return submit_files(chunk, id_prefix, self._document_pool())
+                except concurrent.futures.BrokenExecutor:
+                    pass  # a worker died hard in an earlier batch; submit() refused this one
+            return submit_files(chunk, id_prefix, self._document_pool(fresh=True))
+        
+        # The next batch is queued once the current one has drained, so workers extract it while
+        # this batch's file is written; it is the only lookahead, so at most two batches of
+        # extracted text are held at once
+        pending = submit_batch(file_chunks[0]) if file_chunks else {}
+        for chunk_index, chunk in enumerate(file_chunks):
+            current = pending
+            next_chunk = file_chunks[chunk_index + 1] if chunk_index + 1 < len(file_chunks) else None
+            
             output_filename = f"{base_name}_{batch_num}.txt"
             output_filepath = os.path.join(output_dir, output_filename)
             self.log_queue.put((f"\n--- Starting Batch {batch_num} -> {output_filename} ---", 'HEADER'))
             processed_docs: List[Dict[str, Any]] = []
+            order_map = {path: i for i, path in enumerate(chunk)}
             
-            max_workers = min(max(2, (os.cpu_count() or 2)), 4)
-            with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
-                future_to_file = {executor.submit(process_single_file, fp, id_prefix): fp for fp in chunk}
-                for future in concurrent.futures.as_completed(future_to_file):
-                    src_path = future_to_file[future]
-                    file_path_for_log = os.path.basename(src_path)
-                    try:
-                        _, result = future.result()
-                    except Exception as e:
-                        result = {"error": f"Worker crashed: {e}"}
-                    
-                    if "error" in result:
-                        total_failed += 1
-                        self.log_queue.put((f"  ├─ Error on '{file_path_for_log}': {result['error']}", 'ERROR'))
-                    else:
-                        result["_order"] = chunk.index(src_path)
-                        processed_docs.append(result)
-                        self.log_queue.put((f"  ├─ Success! ID: {result['short_id']} for '{file_path_for_log}'", 'SUCCESS'))
-                    
-                    done += 1
-                    self.log_queue.put((f"__PROGRESS__{int(done * 100 / total)}", 'INFO'))
+            for src_path, result in collect_files(current, id_prefix, self._document_pool()):
+                file_path_for_log = os.path.basename(src_path)
+                if "error" in result:
+                    total_failed += 1
+                    self.log_queue.put((f"  ├─ Error on '{file_path_for_log}': {result['error']}", 'ERROR'))
+                else:
+                    result["_order"] = order_map[src_path]
+                    processed_docs.append(result)
+                    self.log_queue.put((f"  ├─ Success! ID: {result['short_id']} for '{file_path_for_log}'", 'SUCCESS'))
+                
+                done += 1
+                pct = done * 100 // total
+                if pct != last_pct:  # the bar only shows whole percents
+                    self.log_queue.put((f"__PROGRESS__{pct}", 'INFO'))
+                    last_pct = pct
+            
+            # Only now, with every future of this batch done: a next-batch document that kills its
+            # worker breaks the pool, and must not fail this batch's unfinished documents with it.
+            # If the pool died during this batch (or its PDF range tasks), start a fresh one
+            broken = any(isinstance(f.exception(), concurrent.futures.BrokenExecutor) for f in current)
+            pending = submit_batch(next_chunk, fresh_pool=broken) if next_chunk else {}
             
             if processed_docs:
                 processed_docs.sort(key=lambda x: x['_order'])
                 try:
-                    with open(output_filepath, 'w', encoding='utf-8', newline='\n') as outfile:
-                        outfile.write(KNOWLEDGE_FILE_HEADER)
-                        outfile.write("\n--- TABLE OF CONTENTS ---\n")
-                        for doc in processed_docs:
-                            outfile.write(f"[DocID: {doc['short_id']} ({doc['full_hash']}) | Title: {doc['title']}]\n")
-                        outfile.write("--- END OF TOC ---\n\n")
+                    # Binary sink: each piece is encoded once, with no text layer re-chunking the bodies
+                    with open(output_filepath, 'wb', buffering=OUTPUT_WRITE_BUFFER) as outfile:
+                        outfile.write("".join((
+                            KNOWLEDGE_FILE_HEADER,
+                            "\n--- TABLE OF CONTENTS ---\n",
+                            *[f"[DocID: {doc['short_id']} ({doc['full_hash']}) | Title: {doc['title']}]\n"
+                              for doc in processed_docs],
+                            "--- END OF TOC ---\n\n",
+                        )).encode('utf-8'))
                         
-                        for doc in processed_docs:
-                            outfile.write(f"[START OF DOCUMENT: {doc['short_id']} | Title: {doc['title']}]\n\n")
-                            clean = sanitize_text(doc['text'])
-                            # Soft-wrap long lines
-                            clean = re.sub(r'[^\n]{10000,}',
-                                         lambda m: '\n'.join(m.group(0)[i:i+10000] for i in range(0, len(m.group(0)), 10000)),
-                                         clean)
-                            outfile.write(clean)
-                            outfile.write(f"\n\n[END OF DOCUMENT: {doc['short_id']}]\n---\n\n")
+                        # The next documents are sanitized and encoded on threads while this one is written
+                        for section in prefetch_map(render_document_section, processed_docs,
+                                                    window=RENDER_AHEAD_DOCS, workers=RENDER_AHEAD_DOCS):
+                            outfile.writelines(section)
                     
                     self.log_queue.put((f"✅ Batch {batch_num} complete. Wrote {len(processed_docs)} documents.", 'SUCCESS'))
                     total_processed += len(processed_docs)
@@ -1192,29 +1711,20 @@ class UnifiedLLMPrepTool:
         self.log_queue.put(("Starting Reference Sheet creation...", 'SUMMARY'))
         doc_references: Dict[str, Dict[str, str]] = {}
         
-        doc_id_regex = re.compile(r"^\[DocID: ([A-Z0-9]+) \((sha256-[a-f0-9]{64})\) \| Title: ([^\]]+)\]\s*$")
-        
         total_matches = 0
-        for path in input_paths:
+        # Files are scanned ahead on reader threads; results are merged here, in input order
+        for path, (entries, skipped, error) in zip(input_paths, prefetch_map(scan_doc_id_entries, input_paths)):
             source_filename = os.path.basename(path)
             self.log_queue.put((f"Scanning: {source_filename}", 'INFO'))
-            matches_in_file = 0
-            try:
-                with open(path, 'r', encoding='utf-8', errors='ignore') as infile:
-                    for line in infile:
-                        m = doc_id_regex.match(line)
-                        if m:
-                            short_id, _, title = m.groups()
-                            doc_references.setdefault(short_id, {'title': title, 'source': source_filename})
-                            matches_in_file += 1
-                        else:
-                            if "[DocID:" in line:
-                                self.log_queue.put((f"  ├─ Skipped line (format mismatch): {line.strip()}", 'INFO'))
-            except Exception as e:
-                self.log_queue.put((f"  ├─ Could not parse file: {e}", 'ERROR'))
+            for line in skipped:
+                self.log_queue.put((f"  ├─ Skipped line (format mismatch): {line}", 'INFO'))
+            if error is not None:
+                self.log_queue.put((f"  ├─ Could not parse file: {error}", 'ERROR'))
+            for short_id, title in entries:
+                doc_references.setdefault(short_id, {'title': title, 'source': source_filename})
             
-            total_matches += matches_in_file
-            self.log_queue.put((f"  ├─ Found {matches_in_file} entries", 'INFO'))
+            total_matches += len(entries)
+            self.log_queue.put((f"  ├─ Found {len(entries)} entries", 'INFO'))
         
         if not doc_references:
             self.log_queue.put(("\nNo valid DocID entries found. Check file format and regex.", 'ERROR'))
@@ -1222,13 +1732,14 @@ class UnifiedLLMPrepTool:
         
         sorted_refs = sorted(doc_references.items(), key=lambda item: item[1]['title'].lower())
         try:
-            with open(output_path, 'w', encoding='utf-8', newline='\n') as outfile:
+            with open(output_path, 'w', encoding='utf-8', newline='\n', buffering=OUTPUT_WRITE_BUFFER) as outfile:
                 outfile.write(REFERENCE_SHEET_HEADER)
                 outfile.write("\n--- GLOBAL DOCUMENT INDEX ---\n")
-                outfile.write("\n".join(
-                    f"[DocID: {s_id} | Title: {d['title']}] | [SourceFile: {d['source']}]" for s_id, d in sorted_refs
-                ))
-                outfile.write("\n--- END OF INDEX ---\n")
+                # Entries go straight into the 1 MiB buffer rather than through one joined copy
+                write = outfile.write
+                for s_id, d in sorted_refs:
+                    write(f"[DocID: {s_id} | Title: {d['title']}] | [SourceFile: {d['source']}]\n")
+                outfile.write("--- END OF INDEX ---\n")
             self.log_queue.put(("\n--- Finalization ---", 'HEADER'))
             self.log_queue.put((f"Successfully indexed {len(sorted_refs)} unique documents (from {total_matches} matches).", 'SUCCESS'))
         except IOError as e:
@@ -1249,10 +1760,13 @@ class UnifiedLLMPrepTool:
         try:
             with open(path, 'r', encoding='utf-8', errors='ignore') as f:
                 new_files = [line.strip() for line in f if line.strip()]
+            candidates = [p for p in dict.fromkeys(new_files) if p not in self.file_queue_set]
+            present = existing_paths(candidates)
             added_count = 0
-            for file_path in new_files:
-                if os.path.exists(file_path) and file_path not in self.file_queue:
+            for file_path in candidates:
+                if file_path in present:
                     self.file_queue.append(file_path)
+                    self.file_queue_set.add(file_path)
                     added_count += 1
             self.update_queue_display()
             messagebox.showinfo("Success", f"Imported {len(new_files)} paths.\nAdded {added_count} new, valid files.")
@@ -1272,9 +1786,10 @@ class UnifiedLLMPrepTool:
         if not path:
             return
         try:
-            sorted_queue = sorted(self.file_queue, key=os.path.basename)
-            with open(path, 'w', encoding='utf-8', newline='\n') as f:
-                f.write("\n".join(sorted_queue))
+            sorted_queue = self.sorted_file_queue
+            # Encoded once and written through the binary layer, in one write for most queues
+            with open(path, 'wb', buffering=OUTPUT_WRITE_BUFFER) as f:
+                f.write("\n".join(sorted_queue).encode('utf-8'))
             messagebox.showinfo("Success", f"Successfully exported {len(sorted_queue)} file paths.")
         except Exception as e:
             messagebox.showerror("Export Error", f"Could not export queue file: {e}")
@@ -1335,19 +1850,27 @@ class UnifiedLLMPrepTool:
         # Handle progress updates specially
         if message.startswith("__PROGRESS__"):
             try:
-                pct = int(message.split("__PROGRESS__")[1])
-                self.progress['value'] = pct
-                self.root.update_idletasks()
+                self._set_progress(int(message.split("__PROGRESS__")[1]))
                 return
             except Exception:
                 pass
         
-        self.log_display.config(state='normal')
         timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-        self.log_display.insert(tk.END, f"[{timestamp}] {message}\n", level.upper())
+        # Drawn by the event loop when the current callback returns, not forced per line
+        self._append_log(f"[{timestamp}] {message}\n", level.upper())
+    
+    def _set_progress(self, pct: int):
+        """Move the progress bar, skipping the Tk call when the value is unchanged."""
+        if pct != self._last_pct:
+            self.progress['value'] = pct
+            self._last_pct = pct
+    
+    def _append_log(self, *text_and_tags: str):
+        """Append alternating text, tag arguments to the log with one Text.insert and one scroll."""
+        self.log_display.config(state='normal')
+        self.log_display.insert(tk.END, *text_and_tags)
         self.log_display.config(state='disabled')
         self.log_display.see(tk.END)
-        self.root.update_idletasks()
     
     def _start_worker_thread(self, target_func, args_tuple):
         """Start a worker thread and manage UI state."""
@@ -1357,7 +1880,7 @@ class UnifiedLLMPrepTool:
         self.log_display.config(state='normal')
         self.log_display.delete('1.0', tk.END)
         self.log_display.config(state='disabled')
-        self.progress['value'] = 0
+        self._set_progress(0)
         
         # Start worker thread
         self.processing_thread = threading.Thread(target=target_func, args=args_tuple, daemon=True)
@@ -1379,27 +1902,47 @@ class UnifiedLLMPrepTool:
             self.clear_queue_button.config(state=state)
     
     def _check_log_queue(self):
-        """Check for log messages from worker threads."""
-        try:
-            while True:
-                message, level = self.log_queue.get_nowait()
-                self.log_message(message, level)
-        except queue.Empty:
-            pass
+        """Check for log messages from worker threads.
+
+        Everything queued since the last poll is shown with a single Text insert, and only the
+        newest progress value is applied, so a chatty worker costs one redraw per tick.
+        """
+        timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+        # Take the whole backlog under one acquisition of the queue's lock instead of one per
+        # get_nowait(); the queue is unbounded, so no producer is ever waiting on not_full
+        with self.log_queue.mutex:
+            items = list(self.log_queue.queue)
+            self.log_queue.queue.clear()
+        pending: List[str] = []  # alternating text, tag arguments for one Text.insert call
+        progress = None
+        for message, level in items:
+            if message.startswith("__PROGRESS__"):
+                try:
+                    progress = int(message[len("__PROGRESS__"):])
+                    continue
+                except ValueError:
+                    pass
+            pending += (f"[{timestamp}] {message}\n", level.upper())
+        
+        if progress is not None:
+            self._set_progress(progress)
+        if pending:
+            self._append_log(*pending)
         
         if self.processing_thread and self.processing_thread.is_alive():
             self.root.after(100, self._check_log_queue)
         else:
             self._set_ui_state(True)
-            self.progress['value'] = 0
+            self._set_progress(0)
     
     def _on_closing(self):
         """Handle application closing."""
         if self.processing_thread and self.processing_thread.is_alive():
-            if messagebox.askyesno("Exit", "Processing is active. Are you sure you want to exit?"):
-                self.root.destroy()
-        else:
-            self.root.destroy()
+            if not messagebox.askyesno("Exit", "Processing is active. Are you sure you want to exit?"):
+                return
+        if self._doc_pool is not None:
+            self._doc_pool.shutdown(wait=False, cancel_futures=True)
+        self.root.destroy()
 
 
 # =======================================================================================
@@ -1,48 +1,86 @@
 import os
+import sys
 import argparse
+import atexit
 import logging
-from openai import OpenAI, APIError, RateLimitError
-from dotenv import load_dotenv
+import logging.handlers
+import queue
+
+def start_file_logging(filename: str) -> logging.handlers.QueueListener:
+    """Route root log records through a queue to ``filename``; a background thread does the disk writes."""
+    file_handler = logging.FileHandler(filename, delay=True)
+    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+    records: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.addHandler(logging.handlers.QueueHandler(records))
+    listener = logging.handlers.QueueListener(records, file_handler)
+    listener.start()
+    return listener
 
 def main():
-    load_dotenv()
     parser = argparse.ArgumentParser(description="A CLI tool to interact with the DeepSeek API.")
-    parser.add_argument("prompt", type=str, help="The prompt to send to the DeepSeek API.")
+    parser.add_argument("prompt", type=str, nargs="?", help="The prompt to send to the DeepSeek API.")
+    parser.add_argument("--batch", action="store_true",
+                        help="Read one prompt per line from stdin, sending them all over one client connection.")
     args = parser.parse_args()
+    if args.batch == (args.prompt is not None):
+        parser.error("give either a prompt or --batch")
+
+    from dotenv import load_dotenv
+    load_dotenv()
 
-    logging.basicConfig(filename='deepseek_conversation.log', level=logging.INFO, format='%(asctime)s - %(message)s')
+    # Stopped at exit, after the queued records have been written out
+    atexit.register(start_file_logging('deepseek_conversation.log').stop)
 
     api_key = os.getenv("DEEPSEEK_API_KEY")
     if not api_key or api_key == "your_api_key_here":
         print("Error: DEEPSEEK_API_KEY not found or not set in .env file.")
         return
 
+    # Imported only once there is a request to make: openai pulls in httpx and pydantic,
+    # which --help, usage errors and a missing key never need
+    from openai import OpenAI, APIError, RateLimitError
     client = OpenAI(
         api_key=api_key,
         base_url="https://api.deepseek.com"
     )
 
-    try:
-        logging.info(f"Prompt: {args.prompt}")
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[
-                {"role": "user", "content": args.prompt}
-            ],
-            temperature=0.7,
-            max_tokens=2000
-        )
-        response_content = response.choices[0].message.content
-        logging.info(f"Response: {response_content}")
-        print(response_content)
-    except RateLimitError:
-        error_message = "Rate limit exceeded. Please slow down requests."
-        logging.error(error_message)
-        print(error_message)
-    except APIError as e:
-        error_message = f"API error: {e}"
-        logging.error(error_message)
-        print(error_message)
+    # The client keeps its HTTP connection alive, so batch prompts after the first skip the TLS setup
+    prompts = (line.strip() for line in sys.stdin) if args.batch else [args.prompt]
+    for prompt in prompts:
+        if not prompt:
+            continue
+        try:
+            logging.info(f"Prompt: {prompt}")
+            response = client.chat.completions.create(
+                model="deepseek-chat",
+                messages=[
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.7,
+                max_tokens=2000,
+                stream=True
+            )
+            # Print tokens as they arrive instead of waiting for the whole completion
+            parts = []
+            for chunk in response:
+                token = chunk.choices[0].delta.content if chunk.choices else None
+                if token:
+                    sys.stdout.write(token)
+                    sys.stdout.flush()
+                    parts.append(token)
+            print()
+            response_content = "".join(parts)
+            logging.info(f"Response: {response_content}")
+        except RateLimitError:
+            error_message = "Rate limit exceeded. Please slow down requests."
+            logging.error(error_message)
+            print(error_message)
+        except APIError as e:
+            error_message = f"API error: {e}"
+            logging.error(error_message)
+            print(error_message)
 
 if __name__ == "__main__":
     main()
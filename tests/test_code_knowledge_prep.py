@@ -0,0 +1,230 @@
+"""Pins Code_Knowledge_Prep's output bytes to the original implementation's on a fixture tree.
+
+The digests below were taken from the original (pre-optimization) module run on the same
+fixtures; a change that alters bundle, knowledge-file or DocID bytes must update them knowingly.
+"""
+import concurrent.futures
+import hashlib
+import itertools
+import multiprocessing
+import os
+import queue
+import re
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import Code_Knowledge_Prep as ckp  # noqa: E402
+
+needs_documents = pytest.mark.skipif(not ckp.DOCUMENT_SUPPORT, reason="document libraries not installed")
+needs_fork = pytest.mark.skipif(multiprocessing.get_start_method() != "fork",
+                                reason="pool workers must inherit the patched extractor")
+
+# Relative path -> contents; the .gitignore mixes fnmatch-style and gitignore-only patterns
+TREE = {
+    ".gitignore": "*.tmp\n!keep.tmp\nlogs/\n# comment\nsecret.txt\n/Makefile\n",
+    "Makefile": "all:\n\techo hi\n",
+    "README.md": "# Fixture\r\n\r\nA project.\n",
+    "src/main.py": "print('hi')\n",
+    "src/pkg/__init__.py": "",
+    "src/pkg/util.js": "export const x = 1;",
+    "src/pkg/deep/lib.rs": "fn main() {}\n\n",
+    "src/pkg/deep/blob.dat": b"abc\x00def",
+    "src/pkg/deep/notes.unknownext": "héllo wörld\r\nline2\n".encode(),
+    "src/logo.png": b"\x89PNG\r\n\x1a\n....",
+    "src/Makefile": "nested:\n\ttrue\n",
+    "node_modules/dep/index.js": "y",
+    "build/out.c": "int x;",
+    "logs/run.txt": "log",
+    "scratch.tmp": "tmp",
+    "keep.tmp": "kept",
+    "secret.txt": "s",
+    "big.txt": "A" * 3000 + "\n" + "B" * 100,
+    "latin1.txt": b"caf\xe9 \xff\xfe\n",
+}
+
+# Files the original fnmatch matching keeps; pathspec re-includes keep.tmp and anchors /Makefile
+FNMATCH_FILES = [
+    "Makefile", "README.md", "big.txt", "latin1.txt", "src/Makefile", "src/logo.png", "src/main.py",
+    "src/pkg/__init__.py", "src/pkg/deep/blob.dat", "src/pkg/deep/lib.rs",
+    "src/pkg/deep/notes.unknownext", "src/pkg/util.js",
+]
+PATHSPEC_FILES = sorted((set(FNMATCH_FILES) - {"Makefile"}) | {"keep.tmp"})
+
+# (sort mode, max bytes per file, max total bytes) -> sha256 of the bundle
+BUNDLE_CASES = [("path", 2000, 50_000_000), ("size", 2000, 50_000_000), ("ext", 50, 200)]
+FNMATCH_BUNDLES = {
+    "path": "50fc1b0764836c6a66a682bd592e56de599dfa40e27472717bb1dde78e9be4ea",
+    "size": "727d8260e79d3b398b3dd8e5718bdcff87daf88d3ed3870a546bb1802b33d78b",
+    "ext": "8064b2e07b0b9a9eda332e5bbd65cceed5fa716a18109acbb29198b9beaf68ca",
+}
+PATHSPEC_BUNDLES = {
+    "path": "50f0925e85ae57cd5c92cbba021d143e6f846e8c3dbc83b0b31516aeb50a6df8",
+    "size": "545265d0ad7a9d8db171a2454ba9e6e42d43b01e3e2091da8dcab3b434b71a2a",
+    "ext": "96a3199accb61227d982c6a2a0af4b09bb0e8450dfe60cfdc271476fc9fdc0cc",
+}
+
+DOCUMENTS = {
+    "b_notes.md": "# Notes\n\n\n\nSome    text\x0b here\n```\ncode   spaced  \n\n\n\n```\n",
+    "a_doc.txt": "Hello   world\r\n\r\n\r\n\r\nline two\x07\n" + "x" * 5000 + "\nend",
+    "empty.txt": "  \n",
+    "c.unknown": "n",
+}
+KNOWLEDGE_FILES = {"kb_1.txt": "6b0b4efde6c8e5571eaeb916ad9dbb190f0a8144bb44229341ec47b95b442eec"}
+
+
+class Var:
+    """Stands in for a Tk variable."""
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+def make_tool(sort_mode: str = "path") -> "ckp.UnifiedLLMPrepTool":
+    """A tool with just the state the worker methods read; no Tk window is created."""
+    tool = ckp.UnifiedLLMPrepTool.__new__(ckp.UnifiedLLMPrepTool)
+    tool.log_queue = queue.Queue()
+    tool._doc_pool = None
+    tool.follow_symlinks_var = Var(False)
+    tool.sort_mode_var = Var(sort_mode)
+    tool.id_prefix_var = Var("FIX")
+    tool.llm_guide_var = Var("short")
+    return tool
+
+
+def write_files(root: Path, files) -> None:
+    for rel, data in files.items():
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data if isinstance(data, bytes) else data.encode("utf-8"))
+
+
+@pytest.fixture
+def project(tmp_path):
+    root = tmp_path / "proj"
+    write_files(root, TREE)
+    return root
+
+
+@pytest.fixture(params=[False, True], ids=["fnmatch", "pathspec"])
+def use_pathspec(request, monkeypatch):
+    if request.param:
+        pytest.importorskip("pathspec")
+    monkeypatch.setattr(ckp, "PATHSPEC_SUPPORT", request.param)
+    return request.param
+
+
+def test_iter_files(project, use_pathspec):
+    patterns = ckp.DEFAULT_IGNORE + ckp.read_gitignore_patterns(project)
+    rels = [entry.rel for entry in ckp.iter_files(project, patterns, follow_symlinks=False)]
+    assert rels == (PATHSPEC_FILES if use_pathspec else FNMATCH_FILES)
+
+
+def test_folded_gitignore_regex_matches_pathspec(monkeypatch):
+    pathspec = pytest.importorskip("pathspec")
+    patterns = ckp.DEFAULT_IGNORE + ["/anchored", "a/**/b", "*.txt", "docs/private*", "logs/", "src/*.c"]
+    spec = pathspec.GitIgnoreSpec.from_lines(patterns)
+    folded = ckp._fold_gitignore_spec(spec)
+    assert folded is not None
+    # The fold relies on pathspec's regex text; compare it with pathspec on files and "dir/" paths
+    segments = ["a", "b", "anchored", "docs", "private_x", "logs", "src", "x.c", "n.txt",
+                ".git", "node_modules", "build", "README.md", "package-lock.json"]
+    rels = ["/".join(parts) for depth in (1, 2, 3) for parts in itertools.product(segments, repeat=depth)]
+    for rel in rels + [rel + "/" for rel in rels]:
+        assert bool(folded.search(rel)) == spec.match_file(rel), rel
+    assert ckp._fold_gitignore_spec(pathspec.GitIgnoreSpec.from_lines(patterns + ["!keep.txt"])) is None
+    # IgnoreMatcher takes the folded path whenever it can
+    monkeypatch.setattr(ckp, "PATHSPEC_SUPPORT", True)
+    assert ckp.IgnoreMatcher(patterns).spec_match.__self__.pattern == folded.pattern
+
+
+@pytest.mark.parametrize("sort_mode,max_bytes,max_total", BUNDLE_CASES)
+def test_bundle_bytes(project, tmp_path, use_pathspec, sort_mode, max_bytes, max_total):
+    out = tmp_path / "bundle.txt"
+    make_tool(sort_mode)._bundle_project_worker(project, out, max_bytes, max_total)
+    data = re.sub(rb"# Generated: [^\n]*\n", b"# Generated: X\n", out.read_bytes())
+    data = data.replace(str(project).encode("utf-8"), b"ROOT")
+    expected = PATHSPEC_BUNDLES if use_pathspec else FNMATCH_BUNDLES
+    assert hashlib.sha256(data).hexdigest() == expected[sort_mode]
+
+
+@needs_documents
+def test_knowledge_file_bytes(tmp_path):
+    write_files(tmp_path, DOCUMENTS)
+    paths = [str(tmp_path / name) for name in DOCUMENTS] + [str(tmp_path / "missing.txt")]
+    out_dir = tmp_path / "kb"
+    out_dir.mkdir()
+    tool = make_tool()
+    try:
+        tool._process_documents_worker(paths, str(out_dir), "kb", 2, "FIX")
+    finally:
+        if tool._doc_pool is not None:
+            tool._doc_pool.shutdown()
+    digests = {}
+    for name in sorted(os.listdir(out_dir)):
+        data = (out_dir / name).read_bytes().replace(str(tmp_path).encode("utf-8"), b"TMP")
+        digests[name] = hashlib.sha256(data).hexdigest()
+    assert digests == KNOWLEDGE_FILES
+
+
+@needs_documents
+@pytest.mark.parametrize("text,content_hash,short_id", [
+    ("", "sha256-7e8cd2056da73a7fefb6cd91f4e5d199d08d9058c517b9a2476b1b520324d674", "FIX1DBLJIRWYV"),
+    ("abc", "sha256-59bb9a2f10f7f4308130a166e960930308cdb16402798f753a2810e146573aea", "FIXYZ0TQFZSN"),
+    ("x" * 7000, "sha256-f13e7b219ff52e25198d68afe87920eb67057ebe5e5174880b272613bf0f50fd", "FIX2M0UGW1XIT"),
+])
+def test_doc_id_hashing(text, content_hash, short_id):
+    # The original hashed the title joined with a head/middle/tail sample of the text
+    assert ckp.stable_hash("Title", *ckp._stable_sample_parts(text)) == content_hash
+    assert ckp.IDManager.generate_short_id(content_hash, prefix="FIX") == short_id
+
+
+@needs_documents
+def test_html_to_text_keeps_code_verbatim():
+    html = ("<html><head><title>T</title><style>p {}</style></head><body><h1>Ch 1</h1>"
+            "<p>Some   <b>bold</b>\n\n\n\ntext and <ruby>漢<rp>(</rp><rt>kan</rt><rp>)</rp></ruby>.</p>"
+            "<pre>\ndef f():\n    return  1\n</pre><p>Use <code>x  = 1</code> here.</p>"
+            "<script>var a;</script></body></html>")
+    # Pinned to the original's output: the newline opening <pre> is kept and ruby annotations are dropped
+    assert ckp._html_to_text_preserving_code(html) == (
+        "T\nCh 1\nSome\nbold\n\ntext and\n漢\n.@@@CODEBLOCK_START@@@\n\ndef f():\n    return  1\n\n"
+        "@@@CODEBLOCK_END@@@Use@@@CODEBLOCK_START@@@\nx  = 1\n@@@CODEBLOCK_END@@@here.")
+
+
+@needs_documents
+@needs_fork
+def test_worker_crash_spares_earlier_batch(tmp_path, monkeypatch):
+    """A document that kills its worker fails alone; the batch before it is still written whole."""
+    real_extract = ckp.extract_text_from_txt
+
+    def extract(file_path):
+        name = os.path.basename(file_path)
+        if "slow" in name:
+            time.sleep(1.0)
+        elif "crash" in name:
+            os._exit(1)
+        return real_extract(file_path)
+
+    monkeypatch.setattr(ckp, "extract_text_from_txt", extract)
+    names = ["a_slow.txt", "b.txt", "c_crash.txt", "d.txt"]  # batches of two, in sorted order
+    write_files(tmp_path, {name: f"Body of {name}\n" for name in names})
+    out_dir = tmp_path / "kb"
+    out_dir.mkdir()
+    tool = make_tool()
+    tool._doc_pool = concurrent.futures.ProcessPoolExecutor(max_workers=2)
+    try:
+        tool._process_documents_worker([str(tmp_path / n) for n in names], str(out_dir), "kb", 2, "FIX")
+    finally:
+        if tool._doc_pool is not None:
+            tool._doc_pool.shutdown()
+    logs = []
+    while not tool.log_queue.empty():
+        logs.append(tool.log_queue.get()[0])
+    first_batch = (out_dir / "kb_1.txt").read_text(encoding="utf-8")
+    assert "Title: A_Slow]" in first_batch and "Title: B]" in first_batch
+    assert any("Error on 'c_crash.txt': Worker crashed" in message for message in logs)